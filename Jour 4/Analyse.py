@@ -1,92 +1,926 @@
-import os
-os.chdir(r"C:\Users\OCEANE\Documents\SiLa Challenge\Jour 4")
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-# --- Settings for neat visuals ---
-sns.set_theme(style="whitegrid")
-plt.rcParams["figure.figsize"] = (10, 6)
-
-# --- Load datasets ---
-titanic = pd.read_csv("Titanic-Dataset.csv")
-iris = pd.read_csv("iris.data.csv", header=None,
-                   names=["sepal_length", "sepal_width", "petal_length", "petal_width", "species"])
-amazon = pd.read_csv("bestsellers with categories.csv")
-weather = pd.read_csv("combined_output.csv")
-
-# --- Step 2: Add a source column to each dataset ---
-titanic["source"] = "titanic"
-iris["source"] = "iris"
-amazon["source"] = "amazon"
-weather["source"] = "weather"
-
-# --- Merge all into one ---
-combined = pd.concat([titanic, iris, amazon, weather], ignore_index=True)
-
-# --- Clean missing values with median ---
-numeric_cols = combined.select_dtypes(include="number").columns
-combined[numeric_cols] = combined[numeric_cols].fillna(combined[numeric_cols].median())
-
-print("Missing values after cleaning:")
-print(combined.isnull().sum().sum())
-
-print("Datasets loaded successfully!")
-
-# --- 1. TITANIC: Survival by Gender ---
-sns.countplot(data=titanic, x="Survived", hue="Sex", palette="pastel")
-plt.title("Titanic - Survival by Gender")
-plt.xticks([0, 1], ["Did not survive", "Survived"])
-plt.tight_layout()
-plt.savefig("titanic_survival.png")
-plt.show()
-
-# --- 2. IRIS: Petal Length by Species ---
-sns.boxplot(data=iris, x="species", y="petal_length", palette="Set2")
-plt.title("Iris - Petal Length by Species")
-plt.tight_layout()
-plt.savefig("iris_petal.png")
-plt.show()
-
-# --- 3. AMAZON: Top 10 Authors ---
-top_authors = amazon["Author"].value_counts().head(10)
-sns.barplot(x=top_authors.values, y=top_authors.index, palette="Blues_r")
-plt.title("Amazon - Top 10 Most Frequent Authors")
-plt.xlabel("Number of Books")
-plt.tight_layout()
-plt.savefig("amazon_authors.png")
-plt.show()
-
-# --- 4. WEATHER: Temperature over time ---
-weather["date"] = pd.to_datetime(weather["date"], errors="coerce")
-weather_clean = weather.dropna(subset=["date"])
-sns.lineplot(data=weather_clean, x="date", y="temp_max", color="coral", label="Max Temp")
-sns.lineplot(data=weather_clean, x="date", y="temp_min", color="steelblue", label="Min Temp")
-plt.title("Weather - Temperature Over Time (2018-2022)")
-plt.tight_layout()
-plt.savefig("weather_temp.png")
-plt.show()
-
-# --- Step 3: Detect outliers with IQR ---
-print("\nOutliers detected per column:")
-for col in numeric_cols:
-    Q1 = combined[col].quantile(0.25)
-    Q3 = combined[col].quantile(0.75)
-    IQR = Q3 - Q1
-    outliers = combined[(combined[col] < Q1 - 1.5 * IQR) | (combined[col] > Q3 + 1.5 * IQR)]
-    print(f"{col}: {len(outliers)} outliers")
-
-# --- Step 4: Create derived features ---
-combined["mean_numeric"] = combined[numeric_cols].mean(axis=1)
-combined["median_numeric"] = combined[numeric_cols].median(axis=1)
-combined["std_numeric"] = combined[numeric_cols].std(axis=1)
-
-print("\nNew features added:")
-print(combined[["mean_numeric", "median_numeric", "std_numeric"]].head())
-
-# --- Step 5: Export to CSV and Excel ---
-combined.to_csv("final_output.csv", index=False)
-
-print("\nFiles exported successfully!")
-print(f"Total rows: {len(combined)}")
-print(f"Total columns: {len(combined.columns)}")
+import argparse
+import hashlib
+import html
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import psutil  # current RSS on any platform; falls back to /proc/self/statm without it
+except ImportError:
+    psutil = None
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+import matplotlib.pyplot as plt
+import seaborn as sns
+
+import aggregates
+from aggregates import AggregateCube, QuantileSketch
+
+# --- Settings for neat visuals ---
+sns.set_theme(style="whitegrid")
+plt.rcParams["figure.figsize"] = (10, 6)
+
+DATA_DIR = Path(__file__).resolve().parent
+CHUNKSIZE = 250_000
+ROW_BLOCK = 1_000_000
+DATE_FORMAT = "%Y-%m-%d"
+EXPORT_DIR = "final_output"
+MANIFEST = "_manifest.json"  # leading "_": skipped by Arrow when final_output/ is read as a dataset
+CUBES_DIR = "cubes"
+TIMESERIES_DIR = "timeseries"
+RESAMPLE_FREQS = {"weekly": "W", "monthly": "MS"}
+ROLLING_DAYS = 7
+PIPELINE_VERSION = 2
+
+# --- Per-source schemas: explicit narrow dtypes, categoricals and dates ---
+# Free text stays "str" (Arrow-backed on pandas >= 3), which is far smaller than Python objects.
+SCHEMAS: Dict[str, Dict] = {
+    "titanic": {
+        "file": "Titanic-Dataset.csv",
+        "dtype": {
+            "PassengerId": "int32", "Survived": "int8", "Pclass": "int8",
+            "Name": "str", "Sex": "category", "Age": "float32",
+            "SibSp": "int8", "Parch": "int8", "Ticket": "str",
+            "Fare": "float32", "Cabin": "str", "Embarked": "category",
+        },
+    },
+    "iris": {
+        "file": "iris.data.csv",
+        "header": None,
+        "names": ["sepal_length", "sepal_width", "petal_length", "petal_width", "species"],
+        "dtype": {
+            "sepal_length": "float32", "sepal_width": "float32",
+            "petal_length": "float32", "petal_width": "float32",
+            "species": "category",
+        },
+    },
+    "amazon": {
+        "file": "bestsellers with categories.csv",
+        "dtype": {
+            "Name": "str", "Author": "category", "User Rating": "float32",
+            "Reviews": "float32", "Price": "float32", "Year": "int16",
+            "Genre": "category",
+        },
+    },
+    "weather": {
+        "file": "combined_output.csv",
+        "dtype": {"station": "category", "date": "str", "temp_max": "float32", "temp_min": "float32"},
+        "dates": ["date"],
+    },
+}
+
+
+# --- Extract: typed, chunked ingestion ---
+def _downcast(chunk: pd.DataFrame, schema: Dict) -> pd.DataFrame:
+    """Narrow any column the schema does not pin down (e.g. extra weather fields)."""
+    for col in chunk.columns:
+        if col in schema.get("dtype", {}):
+            continue
+        if pd.api.types.is_float_dtype(chunk[col]):
+            chunk[col] = chunk[col].astype("float32")
+        elif pd.api.types.is_integer_dtype(chunk[col]):
+            chunk[col] = pd.to_numeric(chunk[col], downcast="integer")
+    for col in schema.get("dates", []):
+        parsed = pd.to_datetime(chunk[col], format=DATE_FORMAT, errors="coerce")
+        bad = parsed.isna() & chunk[col].notna()
+        if bad.any():
+            raise ValueError(f"{schema['file']}: {int(bad.sum())} '{col}' value(s) do not match "
+                             f"DATE_FORMAT={DATE_FORMAT!r}, e.g. {chunk.loc[bad, col].iloc[0]!r}")
+        chunk[col] = parsed
+    if schema.get("dates"):
+        chunk = chunk.dropna(subset=schema["dates"]).reset_index(drop=True)  # rows without a date are unusable
+    return chunk
+
+
+def iter_source_chunks(name: str, data_dir: Path = DATA_DIR, chunksize: int = CHUNKSIZE,
+                       offset: int = 0) -> Iterator[pd.DataFrame]:
+    """Yield typed chunks of one source CSV, starting at byte `offset` (e.g. appended rows only)."""
+    schema = SCHEMAS[name]
+    path = Path(data_dir) / schema["file"]
+    kwargs = {"dtype": schema["dtype"], "chunksize": chunksize}
+    if "names" in schema:
+        kwargs["header"] = schema["header"]
+        kwargs["names"] = schema["names"]
+    elif offset:
+        kwargs["header"] = None
+        kwargs["names"] = list(pd.read_csv(path, nrows=0).columns)
+    with open(path, "rb") as fh:
+        fh.seek(offset)
+        for chunk in pd.read_csv(fh, **kwargs):
+            yield _downcast(chunk, schema)
+
+
+def _concat_chunks(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate chunks while keeping categoricals (their categories may differ per chunk)."""
+    if len(chunks) == 1:
+        return chunks[0]
+    cat_cols = [c for c in chunks[0].columns if isinstance(chunks[0][c].dtype, pd.CategoricalDtype)]
+    merged = {c: union_categoricals([ch[c] for ch in chunks]) for c in cat_cols}
+    frame = pd.concat([ch.drop(columns=cat_cols) for ch in chunks], ignore_index=True)
+    for col in cat_cols:
+        frame[col] = pd.Categorical(merged[col])
+    return frame[chunks[0].columns]
+
+
+def load_source(name: str, data_dir: Path = DATA_DIR, chunksize: int = CHUNKSIZE, offset: int = 0) -> pd.DataFrame:
+    """Read one source into a single narrow, typed frame."""
+    return _concat_chunks(list(iter_source_chunks(name, data_dir, chunksize, offset)))
+
+
+def available_sources(data_dir: Path = DATA_DIR, sources: Optional[List[str]] = None) -> List[str]:
+    """Sources whose input CSV exists in data_dir (e.g. the weather file is not bundled)."""
+    return [name for name in (sources or list(SCHEMAS)) if (Path(data_dir) / SCHEMAS[name]["file"]).exists()]
+
+
+def load_all(data_dir: Path = DATA_DIR, sources: Optional[List[str]] = None,
+             chunksize: int = CHUNKSIZE) -> Dict[str, pd.DataFrame]:
+    """Load every source into a dict of per-source frames (no sparse union)."""
+    return {name: load_source(name, data_dir, chunksize) for name in (sources or list(SCHEMAS))}
+
+
+def numeric_columns(df: pd.DataFrame) -> List[str]:
+    return list(df.select_dtypes(include="number").columns)
+
+
+def float_columns(df: pd.DataFrame) -> List[str]:
+    """Numeric columns able to hold NaN (the schema pins every other numeric column to an int)."""
+    return list(df.select_dtypes(include="floating").columns)
+
+
+# --- Transform: per-source median imputation ---
+IMPUTE_GROUPS: Dict[str, List[str]] = {"titanic": ["Pclass"]}  # optional group keys per source
+
+
+def impute_medians(df: pd.DataFrame, cols: Optional[List[str]] = None, by: Optional[List[str]] = None,
+                   medians: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+    """Fill NaNs in place with per-group medians, falling back to the source-wide median.
+
+    `medians` may hold precomputed {"global": Series, "groups": DataFrame} (see streaming_medians).
+    """
+    by = list(by or [])
+    cols = [c for c in (cols or numeric_columns(df)) if df[c].hasnans]
+    if not cols:
+        return df
+    grouped_cols = [c for c in cols if c not in by]
+    if medians is None:
+        medians = {"global": df[cols].median()}
+        if by and grouped_cols:
+            medians["groups"] = df.groupby(by, observed=True, sort=False)[grouped_cols].median()
+    groups = medians.get("groups")
+    for col in cols:
+        mask = df[col].isna().to_numpy()
+        if groups is not None and col in groups:
+            keys = df.loc[mask, by]
+            index = pd.MultiIndex.from_frame(keys) if len(by) > 1 else pd.Index(keys[by[0]])
+            fill = groups[col].reindex(index).to_numpy()
+            fill = np.where(np.isnan(fill), medians["global"][col], fill)
+        else:
+            fill = medians["global"][col]
+        df.loc[mask, col] = np.asarray(fill).astype(df[col].dtype)  # sketch medians need not fit float32
+    return df
+
+
+def streaming_medians(chunks: Iterable[pd.DataFrame], cols: Optional[List[str]] = None,
+                      by: Optional[List[str]] = None, decimals: int = 2) -> Dict[str, Any]:
+    """Median estimates from a single pass over chunks, using bounded, mergeable QuantileSketch counts.
+
+    `cols` defaults to the float columns of the first chunk (typed by the schema, so no extra read).
+    Medians are only returned for the columns where the pass saw a NaN.
+    """
+    by = list(by or [])
+    overall, grouped, nans = {}, {}, {}
+    for i, chunk in enumerate(chunks):
+        if i == 0:
+            cols = float_columns(chunk) if cols is None else cols
+            overall = {c: QuantileSketch(decimals=decimals) for c in cols}
+            grouped = {c: QuantileSketch(by, decimals) for c in cols if c not in by} if by else {}
+            nans = dict.fromkeys(cols, False)
+        for col in overall:
+            nans[col] = nans[col] or chunk[col].hasnans
+            overall[col].update(chunk[col])
+            if col in grouped:
+                grouped[col].update(chunk[col], chunk)
+    cols = [c for c, seen in nans.items() if seen]
+    medians = {"global": pd.Series({c: overall[c].median() for c in cols}, dtype="float64")}
+    if grouped and any(c in grouped for c in cols):
+        medians["groups"] = pd.DataFrame({c: grouped[c].median() for c in cols if c in grouped})
+    return medians
+
+
+def iter_imputed_chunks(name: str, data_dir: Path = DATA_DIR, chunksize: int = CHUNKSIZE,
+                        medians: Optional[Dict[str, Any]] = None) -> Iterator[pd.DataFrame]:
+    """Chunks of a source with NaNs filled; `medians` come from a sketch pass when not given."""
+    by = IMPUTE_GROUPS.get(name)
+    if medians is None:
+        medians = streaming_medians(iter_source_chunks(name, data_dir, chunksize), by=by)
+    cols = list(medians["global"].index)
+    for chunk in iter_source_chunks(name, data_dir, chunksize):
+        yield impute_medians(chunk, cols, by, medians) if cols else chunk
+
+
+def load_streaming(name: str, data_dir: Path = DATA_DIR,
+                   chunksize: int = CHUNKSIZE) -> Tuple[pd.DataFrame, Dict[str, AggregateCube]]:
+    """Two reads of a source: raw chunks feed the cubes and the median sketches, then the
+    imputed chunks are concatenated. Cubes still see the raw values, as with load_source.
+    """
+    cubes: Dict[str, AggregateCube] = {}
+
+    def sketch_pass() -> Iterator[pd.DataFrame]:
+        for chunk in iter_source_chunks(name, data_dir, chunksize):
+            if cubes:
+                for cube in cubes.values():
+                    cube.update(chunk)
+            else:
+                cubes.update(build_cubes(name, chunk))
+            yield chunk
+
+    medians = streaming_medians(sketch_pass(), by=IMPUTE_GROUPS.get(name))
+    frame = _concat_chunks(list(iter_imputed_chunks(name, data_dir, chunksize, medians)))
+    return frame, cubes
+
+
+def impute_all(frames: Dict[str, pd.DataFrame]) -> None:
+    for name, df in frames.items():
+        impute_medians(df, by=IMPUTE_GROUPS.get(name))
+
+
+# --- Transform: IQR outliers and row-wise features ---
+def iqr_bounds(df: pd.DataFrame, cols: List[str], k: float = 1.5) -> pd.DataFrame:
+    """Lower/upper IQR fences for every column, from a single quantile([0.25, 0.75]) pass."""
+    q = df[cols].quantile([0.25, 0.75])
+    q1, q3 = q.loc[0.25], q.loc[0.75]
+    iqr = q3 - q1
+    return pd.DataFrame({"lower": q1 - k * iqr, "upper": q3 + k * iqr})
+
+
+def outlier_counts(df: pd.DataFrame, cols: List[str], k: float = 1.5,
+                   block: int = ROW_BLOCK) -> pd.Series:
+    """Count IQR outliers per column with NumPy masks, block by block, without copying frames."""
+    bounds = iqr_bounds(df, cols, k)
+    lower = bounds["lower"].to_numpy()
+    upper = bounds["upper"].to_numpy()
+    counts = np.zeros(len(cols), dtype=np.int64)
+    for start in range(0, len(df), block):
+        values = df[cols].iloc[start:start + block].to_numpy(dtype=np.float64)
+        counts += ((values < lower) | (values > upper)).sum(axis=0)
+    return pd.Series(counts, index=cols, name="outliers")
+
+
+def detect_outliers(frames: Dict[str, pd.DataFrame], k: float = 1.5) -> pd.DataFrame:
+    """Outlier counts per (source, column); thresholds never mix unrelated datasets."""
+    parts = {name: outlier_counts(df, numeric_columns(df), k) for name, df in frames.items()}
+    return pd.concat(parts, names=["source", "column"]).to_frame()
+
+
+def row_features(values: np.ndarray) -> np.ndarray:
+    """Fused row-wise mean, median and sample std (ddof=1) of a 2-D block, NaN-aware."""
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=1)
+    filled = np.where(valid, values, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = filled.sum(axis=1) / count
+        centred = np.where(valid, values - mean[:, None], 0.0)
+        std = np.sqrt((centred * centred).sum(axis=1) / (count - 1))
+        median = np.median(values, axis=1) if valid.all() else np.nanmedian(values, axis=1)
+    std[count < 2] = np.nan
+    return np.column_stack([mean, median, std])
+
+
+def add_row_features(df: pd.DataFrame, cols: List[str], block: int = ROW_BLOCK) -> pd.DataFrame:
+    """Add mean_numeric / median_numeric / std_numeric, one row block at a time."""
+    out = np.empty((len(df), 3), dtype=np.float32)
+    for start in range(0, len(df), block):
+        values = df[cols].iloc[start:start + block].to_numpy(dtype=np.float64)
+        out[start:start + block] = row_features(values)
+    df["mean_numeric"] = out[:, 0]
+    df["median_numeric"] = out[:, 1]
+    df["std_numeric"] = out[:, 2]
+    return df
+
+
+def memory_report(frames: Dict[str, pd.DataFrame]) -> pd.Series:
+    return pd.Series({name: df.memory_usage(deep=True).sum() for name, df in frames.items()},
+                     name="bytes")
+
+
+# --- Load: columnar output partitioned by source, with an input manifest ---
+def file_hash(path: Path, block: int = 1 << 20, limit: Optional[int] = None) -> str:
+    """SHA-256 of a file, or of its first `limit` bytes."""
+    digest = hashlib.sha256()
+    remaining = limit
+    with open(path, "rb") as fh:
+        while remaining is None or remaining > 0:
+            data = fh.read(block if remaining is None else min(block, remaining))
+            if not data:
+                break
+            digest.update(data)
+            remaining = None if remaining is None else remaining - len(data)
+    return digest.hexdigest()
+
+
+def config_hash(source: str) -> str:
+    """Hash of everything besides the input file that shapes a source's outputs.
+
+    Covers PIPELINE_VERSION, the source's SCHEMAS / IMPUTE_GROUPS / CUBES entries, the
+    time-series settings and the pipeline code itself, so editing any of them invalidates it.
+    """
+    config = {
+        "version": PIPELINE_VERSION, "date_format": DATE_FORMAT,
+        "schema": SCHEMAS[source], "impute": IMPUTE_GROUPS.get(source), "cubes": CUBES.get(source),
+        "timeseries": [RESAMPLE_FREQS, ROLLING_DAYS] if source == "weather" else None,
+        "code": [file_hash(Path(__file__)), file_hash(Path(aggregates.__file__))],
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def partition_path(export_dir: Path, source: str, fmt: str = "parquet") -> Path:
+    return Path(export_dir) / f"source={source}" / f"part-0.{fmt}"
+
+
+def load_manifest(export_dir: Path) -> Dict:
+    path = Path(export_dir) / MANIFEST
+    if not path.exists():
+        return {"version": PIPELINE_VERSION, "sources": {}}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def missing_artifacts(source: str, out_dir: Path, plots: bool = True, has_rows: bool = True) -> List[Path]:
+    """Derived outputs of a source (cubes, time series, figures) that are not on disk.
+
+    A source without rows only has cubes: its time series and figures are never written.
+    """
+    paths = [cube_path(out_dir, source, cube) / "cube.json" for cube in CUBES.get(source, {})]
+    if source == "weather" and has_rows:
+        paths += list(timeseries_paths(out_dir).values())
+    if plots and has_rows:
+        paths += [Path(out_dir) / filename for src, filename, _ in FIGURES.values() if src == source]
+    return [p for p in paths if not p.exists()]
+
+
+def imputation_mode(streaming: bool) -> str:
+    """Exact in-memory medians, or sketched ones (rounded, see QuantileSketch) when streaming."""
+    return "sketch" if streaming else "exact"
+
+
+def stale_sources(data_dir: Path, out_dir: Path, sources: List[str], fmt: str = "parquet",
+                  plots: bool = True, streaming: bool = False) -> Dict[str, str]:
+    """Sources to recompute, mapped to their input hash.
+
+    A source is stale when its input hash, config hash or imputation mode changed, or when its
+    partition or any derived output (cubes, time series, figures) is missing.
+    """
+    export_dir = Path(out_dir) / EXPORT_DIR
+    manifest = load_manifest(export_dir)
+    known = manifest["sources"] if manifest.get("version") == PIPELINE_VERSION else {}
+    stale = {}
+    for name in sources:
+        digest = file_hash(Path(data_dir) / SCHEMAS[name]["file"])
+        entry = known.get(name, {})
+        if entry.get("sha256") != digest or entry.get("config") != config_hash(name) \
+                or entry.get("imputation") != imputation_mode(streaming) or entry.get("format") != fmt or not partition_path(export_dir, name, fmt).exists() \
+                or missing_artifacts(name, out_dir, plots, entry.get("rows") != 0):
+            stale[name] = digest
+    return stale
+
+
+def write_partition(df: pd.DataFrame, export_dir: Path, source: str, fmt: str = "parquet") -> Path:
+    """Write one compressed partition; categoricals are stored dictionary-encoded.
+
+    A partition written earlier in the other format is removed, so folder scans see one file.
+    """
+    path = partition_path(export_dir, source, fmt)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for old in path.parent.glob("part-0.*"):
+        if old != path:
+            old.unlink()
+    if fmt == "feather":
+        df.reset_index(drop=True).to_feather(path, compression="zstd")
+    else:
+        df.to_parquet(path, compression="zstd", index=False)
+    return path
+
+
+def export_partitions(frames: Dict[str, pd.DataFrame], export_dir: Path,
+                      hashes: Dict[str, str], fmt: str = "parquet", streaming: bool = False) -> Dict:
+    """Rewrite only the given partitions, then record their input hashes in the manifest."""
+    manifest = load_manifest(export_dir)
+    if manifest.get("version") != PIPELINE_VERSION:
+        manifest = {"version": PIPELINE_VERSION, "sources": {}}
+    for name, df in frames.items():
+        path = write_partition(df, export_dir, name, fmt)
+        manifest["sources"][name] = {
+            "file": SCHEMAS[name]["file"], "sha256": hashes[name], "config": config_hash(name),
+            "imputation": imputation_mode(streaming), "format": fmt,
+            "path": str(path.relative_to(export_dir)), "rows": len(df),
+        }
+    (Path(export_dir) / MANIFEST).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    (Path(export_dir) / "manifest.json").unlink(missing_ok=True)  # older name, unreadable as a dataset
+    return manifest
+
+
+def read_partition(export_dir: Path, source: str, columns: Optional[List[str]] = None,
+                   fmt: str = "parquet") -> pd.DataFrame:
+    """Load a single source partition, optionally only some columns."""
+    path = partition_path(export_dir, source, fmt)
+    if fmt == "feather":
+        return pd.read_feather(path, columns=columns)
+    return pd.read_parquet(path, columns=columns)
+
+
+# --- Aggregate cubes: precomputed group-by tables built at ingestion ---
+CUBES: Dict[str, Dict[str, Dict[str, List[str]]]] = {
+    "titanic": {"survival_by_sex": {"dims": ["Survived", "Sex"], "measures": ["Age", "Fare"]}},
+    "iris": {"by_species": {"dims": ["species"],
+                            "measures": ["sepal_length", "sepal_width", "petal_length", "petal_width"],
+                            "sketches": ["sepal_length", "sepal_width", "petal_length", "petal_width"]}},
+    "amazon": {"by_author": {"dims": ["Author"], "measures": ["User Rating", "Reviews", "Price"]}},
+    "weather": {"by_date": {"optional_dims": ["station"], "dims": ["date"],
+                            "measures": ["temp_max", "temp_min"]}},
+}
+
+
+def build_cubes(name: str, df: pd.DataFrame) -> Dict[str, AggregateCube]:
+    """Cubes of one source; `optional_dims` are only kept when the column exists (e.g. station)."""
+    cubes = {}
+    for cube, spec in CUBES.get(name, {}).items():
+        dims = [d for d in spec.get("optional_dims", []) if d in df.columns] + spec["dims"]
+        cubes[cube] = AggregateCube(dims, spec["measures"], spec.get("sketches")).update(df)
+    return cubes
+
+
+def cube_path(out_dir: Path, source: str, cube: str) -> Path:
+    return Path(out_dir) / CUBES_DIR / source / cube
+
+
+def input_info(source: str, data_dir: Path = DATA_DIR, digest: Optional[str] = None) -> Dict[str, Any]:
+    """Input file hash / size and config hash a source's cubes are built from (stored in cube.json)."""
+    path = Path(data_dir) / SCHEMAS[source]["file"]
+    return {"sha256": digest or file_hash(path), "bytes": path.stat().st_size, "config": config_hash(source)}
+
+
+def appended_offset(source: str, data_dir: Path, saved: Dict[str, Any]) -> Optional[int]:
+    """Byte offset of the new rows when the input file only grew by appended lines since `saved`."""
+    path = Path(data_dir) / SCHEMAS[source]["file"]
+    size = saved.get("bytes")
+    if not size or "rows" not in saved or path.stat().st_size <= size:
+        return None
+    with open(path, "rb") as fh:
+        fh.seek(size - 1)
+        if fh.read(1) != b"\n":  # the old last line must be complete
+            return None
+    return size if file_hash(path, limit=size) == saved["sha256"] else None
+
+
+def save_cubes(source: str, cubes: Dict[str, AggregateCube], out_dir: Path, info: Dict[str, Any]) -> None:
+    for cube, agg in cubes.items():
+        agg.input_info = info
+        agg.save(cube_path(out_dir, source, cube))
+
+
+def load_cubes(source: str, out_dir: Path, data_dir: Path = DATA_DIR, df: Optional[pd.DataFrame] = None,
+               digest: Optional[str] = None, force: bool = False) -> Dict[str, AggregateCube]:
+    """Saved cubes of one source, kept in step with its input file.
+
+    Up-to-date cubes are returned as saved. When rows were only appended to the file, just those
+    rows (read from the saved byte offset, or sliced from `df`) are folded in with update().
+    Any other change to the file or config rebuilds the cubes (from `df` when given).
+    """
+    info = input_info(source, data_dir, digest)
+    paths = {cube: cube_path(out_dir, source, cube) for cube in CUBES.get(source, {})}
+    if not force and all((p / "cube.json").exists() for p in paths.values()):
+        cubes = {cube: AggregateCube.load(p) for cube, p in paths.items()}
+        saved = next(iter(cubes.values())).input_info
+        consistent = saved.get("config") == info["config"] and all(c.input_info == saved for c in cubes.values())
+        if consistent and saved.get("sha256") == info["sha256"]:
+            return cubes
+        offset = appended_offset(source, data_dir, saved) if consistent else None
+        if offset is not None:
+            new_rows = load_source(source, data_dir, offset=offset) if df is None else df.iloc[saved["rows"]:]
+            for agg in cubes.values():
+                agg.update(new_rows)
+            save_cubes(source, cubes, out_dir, {**info, "rows": saved["rows"] + len(new_rows)})
+            return cubes
+    df = load_source(source, data_dir) if df is None else df
+    cubes = build_cubes(source, df)
+    save_cubes(source, cubes, out_dir, {**info, "rows": len(df)})
+    return cubes
+
+
+# --- Time series: weather resampling and rolling windows, from the by_date cube ---
+def daily_stats(cube: AggregateCube, station: Optional[str] = None) -> Dict[str, pd.DataFrame]:
+    """count/sum/sumsq/min/max per calendar day on a sorted, gap-free DatetimeIndex.
+
+    Stations are pooled unless one is selected.
+    """
+    daily = {}
+    for stat, frame in cube.stats.items():
+        additive = stat in AggregateCube.ADDITIVE
+        if "station" in cube.dims:
+            if station is not None:
+                frame = frame.xs(station, level="station")
+            else:
+                frame = frame.groupby(level="date").agg("sum" if additive else stat)
+        frame = frame.set_axis(pd.DatetimeIndex(frame.index, name="date")).sort_index()
+        if frame.empty:  # no dated rows: empty daily frames, nothing to resample or plot
+            daily[stat] = frame
+            continue
+        days = pd.date_range(frame.index[0], frame.index[-1], freq="D", name="date")
+        daily[stat] = frame.reindex(days, fill_value=0 if additive else np.nan)
+    return daily
+
+
+def resample_series(daily: Dict[str, pd.DataFrame], freq: str) -> pd.DataFrame:
+    """Exact min / max / mean per period, combined from the daily partial aggregates."""
+    mean = daily["sum"].resample(freq).sum() / daily["count"].resample(freq).sum()
+    lo = daily["min"].resample(freq).min()
+    hi = daily["max"].resample(freq).max()
+    return pd.concat([lo.add_suffix("_min"), hi.add_suffix("_max"), mean.add_suffix("_mean")], axis=1)
+
+
+def _window_sums(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing window sums from one cumulative sum: O(n) whatever the window length."""
+    cum = np.concatenate([np.zeros((1,) + values.shape[1:]), np.cumsum(values, axis=0)])
+    sums = np.full(values.shape, np.nan)
+    sums[window - 1:] = cum[window:] - cum[:-window]
+    return sums
+
+
+def rolling_series(daily: Dict[str, pd.DataFrame], window: int = ROLLING_DAYS) -> pd.DataFrame:
+    """Rolling mean and std (ddof=1) over `window` calendar days, NaN-aware through the counts."""
+    n = _window_sums(daily["count"].to_numpy(dtype=np.float64), window)
+    s = _window_sums(daily["sum"].to_numpy(dtype=np.float64), window)
+    ss = _window_sums(daily["sumsq"].to_numpy(dtype=np.float64), window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(n > 0, s / n, np.nan)
+        std = np.sqrt(np.clip((ss - s * mean) / (n - 1), 0, None))
+    std[n < 2] = np.nan
+    cols = daily["sum"].columns
+    return pd.concat([pd.DataFrame(mean, daily["sum"].index, cols).add_suffix("_rolling_mean"),
+                      pd.DataFrame(std, daily["sum"].index, cols).add_suffix("_rolling_std")], axis=1)
+
+
+def timeseries_paths(out_dir: Path) -> Dict[str, Path]:
+    names = list(RESAMPLE_FREQS) + [f"rolling_{ROLLING_DAYS}d"]
+    return {name: Path(out_dir) / TIMESERIES_DIR / f"weather_{name}.parquet" for name in names}
+
+
+def save_timeseries(cube: AggregateCube, out_dir: Path) -> Dict[str, Path]:
+    """Precompute the weekly / monthly / rolling weather series next to the cubes."""
+    daily = daily_stats(cube)
+    series = {name: resample_series(daily, freq) for name, freq in RESAMPLE_FREQS.items()}
+    series[f"rolling_{ROLLING_DAYS}d"] = rolling_series(daily)
+    paths = timeseries_paths(out_dir)
+    paths[next(iter(paths))].parent.mkdir(parents=True, exist_ok=True)
+    for name, frame in series.items():
+        frame.to_parquet(paths[name])
+    return paths
+
+
+# --- Visualise: one drawing function per chart ---
+def plot_titanic(cubes: Dict[str, AggregateCube], ax: plt.Axes) -> None:
+    counts = cubes["survival_by_sex"].size().rename("count").reset_index()
+    sns.barplot(data=counts, x="Survived", y="count", hue="Sex", palette="pastel", ax=ax)
+    ax.set_title("Titanic - Survival by Gender")
+    ax.set_xticks([0, 1], ["Did not survive", "Survived"])
+
+
+def plot_iris(cubes: Dict[str, AggregateCube], ax: plt.Axes) -> None:
+    stats = cubes["by_species"].sketches["petal_length"].boxplot_stats()
+    boxes = ax.bxp(stats, patch_artist=True, medianprops={"color": "0.25"})["boxes"]
+    for box, color in zip(boxes, sns.color_palette("Set2", len(boxes))):
+        box.set_facecolor(color)
+    ax.set_title("Iris - Petal Length by Species")
+    ax.set_xlabel("species")
+    ax.set_ylabel("petal_length")
+
+
+def plot_amazon(cubes: Dict[str, AggregateCube], ax: plt.Axes) -> None:
+    top_authors = cubes["by_author"].top(10)
+    names = top_authors.index.astype(str)
+    sns.barplot(x=top_authors.values, y=names, hue=names, palette="Blues_r", legend=False, ax=ax)
+    ax.set_title("Amazon - Top 10 Most Frequent Authors")
+    ax.set_xlabel("Number of Books")
+
+
+def plot_weather(cubes: Dict[str, AggregateCube], ax: plt.Axes) -> None:
+    daily = daily_stats(cubes["by_date"])
+    mean = daily["sum"] / daily["count"]
+    rolling = rolling_series(daily)
+    ax.plot(mean.index, mean["temp_max"], color="coral", alpha=0.3, linewidth=0.6)
+    ax.plot(mean.index, mean["temp_min"], color="steelblue", alpha=0.3, linewidth=0.6)
+    ax.plot(rolling.index, rolling["temp_max_rolling_mean"], color="coral", label="Max Temp")
+    ax.plot(rolling.index, rolling["temp_min_rolling_mean"], color="steelblue", label="Min Temp")
+    ax.set_title("Weather - Temperature Over Time (2018-2022)")
+    ax.set_xlabel("date")
+    ax.legend()
+
+
+# name -> (source, output file, drawing function); each chart reads its source's cubes only
+FIGURES: Dict[str, Tuple[str, str, Callable[[Dict[str, AggregateCube], plt.Axes], None]]] = {
+    "titanic": ("titanic", "titanic_survival.png", plot_titanic),
+    "iris": ("iris", "iris_petal.png", plot_iris),
+    "amazon": ("amazon", "amazon_authors.png", plot_amazon),
+    "weather": ("weather", "weather_temp.png", plot_weather),
+}
+
+
+def has_rows(cubes: Dict[str, AggregateCube]) -> bool:
+    return any(len(cube.rows) for cube in cubes.values())
+
+
+def draw_figure(name: str, cubes: Dict[str, AggregateCube], out_dir: Path) -> Path:
+    """Draw one chart on a fresh figure, save it and close it."""
+    _, filename, draw = FIGURES[name]
+    fig, ax = plt.subplots()
+    draw(cubes, ax)
+    fig.tight_layout()
+    path = Path(out_dir) / filename
+    fig.savefig(path)
+    plt.close(fig)
+    return path
+
+
+def render_figure(name: str, data_dir: Path, out_dir: Path) -> Tuple[str, Optional[float]]:
+    """Process-pool worker: read the cubes of the one source it needs and render headless.
+
+    The time is None when the source has no rows and there is nothing to draw.
+    """
+    start = time.perf_counter()
+    plt.switch_backend("Agg")
+    cubes = load_cubes(FIGURES[name][0], out_dir, data_dir)
+    if not has_rows(cubes):
+        return name, None
+    draw_figure(name, cubes, out_dir)
+    return name, time.perf_counter() - start
+
+
+def write_index(out_dir: Path, timings: Dict[str, float], failures: Optional[Dict[str, str]] = None) -> Path:
+    """Small HTML page listing every rendered chart with its render time, and the charts that failed."""
+    items = "\n".join(
+        f'<figure><img src="{html.escape(FIGURES[name][1])}" alt="{html.escape(name)}">'
+        f"<figcaption>{html.escape(name)} — {seconds:.2f} s</figcaption></figure>"
+        for name, seconds in timings.items()
+    )
+    if failures:
+        rows = "\n".join(f"<li><b>{html.escape(name)}</b>: {html.escape(reason)}</li>"
+                         for name, reason in failures.items())
+        items += f"\n<h2>Not rendered</h2>\n<ul>\n{rows}\n</ul>"
+    path = Path(out_dir) / "index.html"
+    path.write_text(f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Analyse report</title></head>"
+                    f"\n<body>\n<h1>Analyse report</h1>\n{items}\n</body></html>\n", encoding="utf-8")
+    return path
+
+
+def generate_report(data_dir: Path = DATA_DIR, out_dir: Path = DATA_DIR, figures: Optional[List[str]] = None,
+                    workers: Optional[int] = None) -> Tuple[Dict[str, float], Dict[str, str]]:
+    """Render every figure in parallel on the Agg backend and write index.html.
+
+    Returns (seconds per rendered figure, reason per figure that was skipped or failed); one
+    missing input or broken chart never prevents the others or the index from being written.
+    """
+    names = figures or list(FIGURES)
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    present = set(available_sources(data_dir))
+    failures = {name: f"input file {SCHEMAS[FIGURES[name][0]]['file']} not found"
+                for name in names if FIGURES[name][0] not in present}
+    todo = [name for name in names if name not in failures]
+    timings = {}
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers or len(todo)) as pool:
+            futures = {name: pool.submit(render_figure, name, data_dir, out_dir) for name in todo}
+            for name, future in futures.items():
+                try:
+                    seconds = future.result()[1]
+                except Exception as exc:  # report it in the index, keep the other charts
+                    failures[name] = f"{type(exc).__name__}: {exc}"
+                    continue
+                if seconds is None:
+                    failures[name] = f"no rows in {SCHEMAS[FIGURES[name][0]]['file']}"
+                else:
+                    timings[name] = seconds
+    write_index(out_dir, timings, failures)
+    return timings, failures
+
+
+# --- Profiling: wall time, CPU time, RSS peak / delta and DataFrame memory per stage ---
+RSS_INTERVAL = 0.005  # seconds between two RSS samples while a stage runs
+
+
+def current_rss_mb() -> Optional[float]:
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1e6
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class RSSSampler:
+    """Polls the current RSS from a background thread and keeps the highest value seen.
+
+    Unlike ru_maxrss (a lifetime high-water mark), the peak only covers the sampled window.
+    """
+
+    def __init__(self, interval: float = RSS_INTERVAL) -> None:
+        self.interval = interval
+        self.start_mb = self.peak_mb = self.end_mb = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self) -> None:
+        rss = current_rss_mb()
+        if rss is not None:
+            self.peak_mb = rss if self.peak_mb is None else max(self.peak_mb, rss)
+        self.end_mb = rss
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self) -> "RSSSampler":
+        self.start_mb = self.peak_mb = current_rss_mb()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+class StageProfiler:
+    """Records one entry per named pipeline stage."""
+
+    def __init__(self) -> None:
+        self.stages: List[Dict[str, Any]] = []
+        self.frames: Dict[str, pd.DataFrame] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        wall, cpu = time.perf_counter(), time.process_time()
+        sampler = RSSSampler()
+        try:
+            with sampler:
+                yield
+        finally:
+            rss_known = sampler.start_mb is not None
+            record = {
+                "stage": name,
+                "wall_s": time.perf_counter() - wall,
+                "cpu_s": time.process_time() - cpu,
+                "rss_start_mb": sampler.start_mb,
+                "peak_rss_mb": sampler.peak_mb,
+                "peak_delta_mb": sampler.peak_mb - sampler.start_mb if rss_known else None,
+                "rss_delta_mb": sampler.end_mb - sampler.start_mb if rss_known else None,
+                "frames_mb": memory_report(self.frames).sum() / 1e6 if self.frames else 0.0,
+            }
+            self.stages.append(record)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.stages).set_index("stage")
+
+
+def run_pipeline(data_dir: Path = DATA_DIR, out_dir: Path = DATA_DIR, sources: Optional[List[str]] = None,
+                 fmt: str = "parquet", force: bool = False, plots: bool = True,
+                 verbose: bool = True, streaming: bool = False) -> StageProfiler:
+    """Run every stage (load, cubes, timeseries, impute, plots, outliers, features, export) under the profiler.
+
+    With `streaming`, the load stage reads each source chunk by chunk with load_streaming: cubes and
+    sketched medians come from the first read, and the separate cubes / impute stages are skipped.
+    """
+    log = print if verbose else (lambda *a, **k: None)
+    profiler = StageProfiler()
+    export_dir = Path(out_dir) / EXPORT_DIR
+    sources = available_sources(data_dir, sources)
+    skipped = [name for name in SCHEMAS if name not in sources]
+    if skipped:
+        log(f"Skipping (input file not found): {', '.join(skipped)}")
+
+    # --- Only recompute the sources whose input file changed ---
+    with profiler.stage("hash"):
+        if force:
+            hashes = {name: file_hash(Path(data_dir) / SCHEMAS[name]["file"]) for name in sources}
+        else:
+            hashes = stale_sources(data_dir, out_dir, sources, fmt, plots, streaming)
+    if not hashes:
+        log(f"All partitions and derived outputs in {out_dir} are up to date.")
+        return profiler
+    log(f"Recomputing: {', '.join(hashes)}")
+
+    # --- Load datasets ---
+    with profiler.stage("load"):
+        if streaming:
+            loaded = {name: load_streaming(name, data_dir) for name in hashes}
+            frames = profiler.frames = {name: frame for name, (frame, _) in loaded.items()}
+            cubes = {name: by_name for name, (_, by_name) in loaded.items()}
+            for name, by_name in cubes.items():
+                info = {**input_info(name, data_dir, hashes[name]), "rows": len(frames[name])}
+                save_cubes(name, by_name, out_dir, info)
+        else:
+            frames = profiler.frames = load_all(data_dir, list(hashes))
+    log("Memory per source (MB):")
+    log((memory_report(frames) / 1e6).round(2).to_string())
+
+    # --- Aggregate cubes used by charts and stats (reused when their input and config match) ---
+    if not streaming:
+        with profiler.stage("cubes"):
+            cubes = {name: load_cubes(name, out_dir, data_dir, df, hashes[name], force)
+                     for name, df in frames.items()}
+    if "weather" in cubes and has_rows(cubes["weather"]):
+        with profiler.stage("timeseries"):
+            save_timeseries(cubes["weather"]["by_date"], out_dir)
+
+    # --- Clean missing values with per-source (and per-group) medians ---
+    if not streaming:
+        with profiler.stage("impute"):
+            impute_all(frames)
+    log("Missing values after cleaning:")
+    log(sum(int(df[numeric_columns(df)].isnull().sum().sum()) for df in frames.values()))
+    log("Datasets loaded successfully!")
+
+    # --- Charts: Titanic, iris, Amazon, weather ---
+    if plots:
+        with profiler.stage("plots"):
+            for name, (source, _, _) in FIGURES.items():
+                if source in cubes and has_rows(cubes[source]):
+                    log(f"Saved {draw_figure(name, cubes[source], out_dir)}")
+                elif source in cubes:
+                    log(f"Skipped {name} chart: no rows in {SCHEMAS[source]['file']}")
+
+    # --- Step 3: Detect outliers with IQR ---
+    with profiler.stage("outliers"):
+        outliers = detect_outliers(frames)
+    log("\nOutliers detected per column:")
+    log(outliers.to_string())
+
+    # --- Step 4: Create derived features ---
+    with profiler.stage("features"):
+        for df in frames.values():
+            add_row_features(df, numeric_columns(df))
+    log("\nNew features added:")
+    for name, df in frames.items():
+        log(f"{name}:")
+        log(df[["mean_numeric", "median_numeric", "std_numeric"]].head())
+
+    # --- Step 5: Export partitioned columnar files + manifest ---
+    with profiler.stage("export"):
+        manifest = export_partitions(frames, export_dir, hashes, fmt, streaming)
+    log("\nFiles exported successfully!")
+    for name in frames:
+        entry = manifest["sources"][name]
+        log(f"{export_dir / entry['path']}: {entry['rows']} rows, {len(frames[name].columns)} columns")
+    return profiler
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="ETL pipeline over the Titanic, iris, Amazon and weather datasets.")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR, help="folder holding the input CSV files")
+    parser.add_argument("--out-dir", type=Path, default=DATA_DIR, help="folder for figures and exports")
+    parser.add_argument("--report", action="store_true",
+                        help="only render the figures headless (in parallel) plus an HTML index")
+    parser.add_argument("--workers", type=int, default=None, help="process pool size for --report")
+    parser.add_argument("--format", choices=["parquet", "feather"], default="parquet",
+                        help="columnar format of the exported partitions")
+    parser.add_argument("--force", action="store_true",
+                        help="recompute every partition even if its input file did not change")
+    parser.add_argument("--streaming", action="store_true",
+                        help="read sources chunk by chunk; cubes and sketched medians come from the same pass")
+    parser.add_argument("--profile", type=Path, default=None,
+                        help="write the per-stage profile (JSON) to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    args.out_dir.mkdir(parents=True, exist_ok=True)
+
+    if args.report:
+        start = time.perf_counter()
+        timings, failures = generate_report(args.data_dir, args.out_dir, workers=args.workers)
+        for name, seconds in timings.items():
+            print(f"{name:10s} {seconds:6.2f} s")
+        for name, reason in failures.items():
+            print(f"{name:10s} not rendered: {reason}")
+        print(f"Report written to {args.out_dir / 'index.html'} in {time.perf_counter() - start:.2f} s")
+        return
+
+    profiler = run_pipeline(args.data_dir, args.out_dir, fmt=args.format, force=args.force,
+                            streaming=args.streaming)
+    if profiler.stages:
+        print("\nStage profile:")
+        print(profiler.to_frame().round(3).to_string())
+    if args.profile:
+        args.profile.write_text(json.dumps(profiler.stages, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
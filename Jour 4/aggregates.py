@@ -0,0 +1,172 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+ALL = "all"  # label of the single group when there are no dimensions
+MAX_BINS = 2048  # distinct rounded values kept per sketch group
+
+
+class QuantileSketch:
+    """Mergeable quantile estimate: counts of values rounded to `decimals`, optionally per group.
+
+    Exact when the data carries no finer precision than `decimals`; each chunk's counts are
+    added to the running ones. Bounded: once a group holds more than
+    `max_bins` distinct values, every value is re-rounded one decimal coarser (10.0, 100.0, ...
+    once `decimals` goes negative), so memory and the per-chunk merge stay O(max_bins) per group.
+    """
+
+    def __init__(self, by: Optional[List[str]] = None, decimals: int = 2, max_bins: int = MAX_BINS) -> None:
+        self.by = list(by or [])
+        self.decimals = decimals
+        self.max_bins = max_bins
+        self.counts = pd.Series(dtype="int64")
+
+    def _rebin(self, counts: pd.Series, decimals: int) -> pd.Series:
+        values = counts.index.get_level_values("_value").to_numpy(dtype=np.float64).round(decimals)
+        keys = [counts.index.get_level_values(b) for b in self.by] + [pd.Index(values, name="_value")]
+        return counts.groupby(keys, observed=True, sort=False).sum()
+
+    def _bound(self) -> None:
+        while len(self.counts) > self.max_bins:
+            widest = self.counts.groupby(level=self.by, observed=True).size().max() if self.by else len(self.counts)
+            if widest <= self.max_bins:
+                break
+            self.decimals -= 1
+            self.counts = self._rebin(self.counts, self.decimals)
+
+    def update(self, values: pd.Series, keys: Optional[pd.DataFrame] = None) -> "QuantileSketch":
+        rounded = values.astype("float64").round(self.decimals).rename("_value")
+        if self.by:
+            counts = pd.concat([keys[self.by], rounded], axis=1).dropna().value_counts(sort=False)
+        else:
+            counts = rounded.dropna().value_counts(sort=False)
+        counts = counts[counts > 0]  # categorical keys also list unobserved combinations
+        self.counts = counts if self.counts.empty else self.counts.add(counts, fill_value=0).astype("int64")
+        self._bound()
+        return self
+
+    @staticmethod
+    def _quantile(counts: pd.Series, q: float) -> float:
+        counts = counts.sort_index()
+        values = counts.index.to_numpy(dtype=np.float64)
+        cum = counts.to_numpy().cumsum()
+        if len(cum) == 0:
+            return np.nan
+        rank = q * (cum[-1] - 1)  # same linear interpolation as pandas' quantile
+        lo, hi = np.searchsorted(cum, [np.floor(rank) + 1, np.ceil(rank) + 1])
+        return values[lo] + (values[hi] - values[lo]) * (rank - np.floor(rank))
+
+    def groups(self) -> Dict[Any, pd.Series]:
+        """Value counts of each group (a single ALL group when ungrouped)."""
+        if not self.by:
+            return {ALL: self.counts}
+        levels = list(range(len(self.by)))
+        grouped = self.counts.groupby(level=levels[0] if len(levels) == 1 else levels)
+        return {key: c.droplevel(levels) for key, c in grouped}
+
+    def quantile(self, q: float = 0.5) -> Union[float, pd.Series]:
+        if not self.by:
+            return self._quantile(self.counts, q)
+        result = pd.Series({key: self._quantile(c, q) for key, c in self.groups().items()}, dtype="float64")
+        return result.rename_axis(self.by)
+
+    def median(self) -> Union[float, pd.Series]:
+        return self.quantile(0.5)
+
+    def boxplot_stats(self, whis: float = 1.5) -> List[Dict[str, Any]]:
+        """One dict per group, in the format expected by matplotlib's Axes.bxp."""
+        stats = []
+        for key, counts in self.groups().items():
+            counts = counts.sort_index()
+            values = counts.index.to_numpy(dtype=np.float64)
+            q1, med, q3 = (self._quantile(counts, q) for q in (0.25, 0.5, 0.75))
+            lo, hi = q1 - whis * (q3 - q1), q3 + whis * (q3 - q1)
+            inside = values[(values >= lo) & (values <= hi)]
+            stats.append({
+                "label": key, "q1": q1, "med": med, "q3": q3,
+                "mean": float(np.average(values, weights=counts.to_numpy())),
+                "whislo": inside.min(), "whishi": inside.max(),
+                "fliers": values[(values < lo) | (values > hi)],
+            })
+        return stats
+
+
+class AggregateCube:
+    """Precomputed group-by table over `dims`: rows, count, sum, sum of squares, min and max
+    of every measure, plus optional quantile sketches. Appending rows only touches the cube.
+    """
+
+    ADDITIVE = ("count", "sum", "sumsq")
+
+    def __init__(self, dims: List[str], measures: List[str], sketches: Optional[List[str]] = None,
+                 decimals: int = 2) -> None:
+        self.dims = list(dims)
+        self.measures = list(measures)
+        self.decimals = decimals
+        self.rows = pd.Series(dtype="int64", name="rows")
+        self.stats: Dict[str, pd.DataFrame] = {}
+        self.sketches = {m: QuantileSketch(self.dims, decimals) for m in (sketches or [])}
+        self.input_info: Dict[str, Any] = {}  # what the cube was built from, saved in cube.json
+
+    @staticmethod
+    def _merge(a, b, how: str):
+        if a is None or len(a) == 0:
+            return b
+        return pd.concat([a, b]).groupby(level=list(range(b.index.nlevels)), observed=True).agg(how)
+
+    def update(self, df: pd.DataFrame) -> "AggregateCube":
+        """Fold new rows into the cube (first load or appended rows alike)."""
+        values = df[self.measures].astype("float64")
+        grouped = values.groupby([df[d] for d in self.dims], observed=True, sort=False)
+        part = {
+            "count": grouped.count(), "sum": grouped.sum(), "min": grouped.min(), "max": grouped.max(),
+            "sumsq": (values * values).groupby([df[d] for d in self.dims], observed=True, sort=False).sum(),
+        }
+        self.rows = self._merge(self.rows, grouped.size().rename("rows"), "sum")
+        for stat, frame in part.items():
+            self.stats[stat] = self._merge(self.stats.get(stat), frame, "sum" if stat in self.ADDITIVE else stat)
+        for measure, sketch in self.sketches.items():
+            sketch.update(df[measure], df)
+        return self
+
+    # --- Queries used by the charts: read the small precomputed tables only ---
+    def size(self) -> pd.Series:
+        return self.rows
+
+    def top(self, n: int = 10) -> pd.Series:
+        return self.rows.nlargest(n)
+
+    # --- Persistence: one folder per cube ---
+    def save(self, path: Path) -> Path:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        table = pd.concat([self.rows] + [f.add_prefix(f"{stat}:") for stat, f in self.stats.items()], axis=1)
+        table.reset_index().to_parquet(path / "table.parquet", index=False)
+        for i, (measure, sketch) in enumerate(self.sketches.items()):
+            sketch.counts.rename("count").reset_index().to_parquet(path / f"sketch_{i}.parquet", index=False)
+        meta = {"dims": self.dims, "measures": self.measures, "sketches": list(self.sketches),
+                "decimals": self.decimals, "sketch_decimals": [s.decimals for s in self.sketches.values()],
+                "input": self.input_info}
+        (path / "cube.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        return path
+
+    @classmethod
+    def load(cls, path: Path) -> "AggregateCube":
+        path = Path(path)
+        meta = json.loads((path / "cube.json").read_text(encoding="utf-8"))
+        cube = cls(meta["dims"], meta["measures"], meta["sketches"], meta["decimals"])
+        cube.input_info = meta.get("input", {})
+        table = pd.read_parquet(path / "table.parquet").set_index(cube.dims or [ALL])
+        cube.rows = table["rows"]
+        for stat in ("count", "sum", "sumsq", "min", "max"):
+            frame = table[[f"{stat}:{m}" for m in cube.measures]]
+            cube.stats[stat] = frame.rename(columns=lambda c: c.split(":", 1)[1])
+        sketch_decimals = meta.get("sketch_decimals", [cube.decimals] * len(meta["sketches"]))
+        for i, measure in enumerate(meta["sketches"]):
+            counts = pd.read_parquet(path / f"sketch_{i}.parquet")
+            cube.sketches[measure].counts = counts.set_index(cube.dims + ["_value"])["count"]
+            cube.sketches[measure].decimals = sketch_decimals[i]
+        return cube
@@ -0,0 +1,94 @@
+import argparse
+import json
+import platform
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import Analyse
+
+WRITE_BLOCK = 500_000  # rows written per to_csv call when scaling a dataset up
+MAX_ROWS = 10_000_000  # rows per scaled source; the weather file alone is already ~1M rows
+
+
+def make_scaled_copy(data_dir: Path, dst_dir: Path, scale: int, sources: List[str],
+                     max_rows: int = MAX_ROWS) -> Dict[str, int]:
+    """Write each source repeated `scale` times, capped at `max_rows` rows, into dst_dir
+    (keeping the original CSV layout).
+    """
+    rows = {}
+    for name in sources:
+        schema = Analyse.SCHEMAS[name]
+        base = Analyse.load_source(name, data_dir)
+        target = min(len(base) * scale, max_rows)
+        reps = max(1, min(WRITE_BLOCK // max(len(base), 1), -(-target // max(len(base), 1))))
+        block = pd.concat([base] * reps, ignore_index=True)
+        header = "names" not in schema  # iris has no header line
+        path = Path(dst_dir) / schema["file"]
+        written = 0
+        with open(path, "w", newline="", encoding="utf-8") as fh:
+            while written < target:
+                n = min(len(block), target - written)
+                block.iloc[:n].to_csv(fh, index=False, header=header and written == 0,
+                                      date_format=Analyse.DATE_FORMAT)
+                written += n
+        rows[name] = target
+    return rows
+
+
+def run_scale(data_dir: Path, scale: int, plots: bool, max_rows: int = MAX_ROWS) -> Dict[str, Any]:
+    """One scale in a fresh process, so peak RSS is not inherited from the previous run."""
+    Analyse.plt.switch_backend("Agg")
+    sources = Analyse.available_sources(data_dir)
+    with tempfile.TemporaryDirectory(prefix=f"analyse_x{scale}_") as tmp:
+        tmp = Path(tmp)
+        rows = make_scaled_copy(data_dir, tmp, scale, sources, max_rows)
+        profiler = Analyse.run_pipeline(tmp, tmp, sources=sources, force=True, plots=plots, verbose=False)
+    return {"scale": scale, "rows": rows, "total_rows": int(np.sum(list(rows.values()))),
+            "stages": profiler.stages}
+
+
+def run_benchmarks(data_dir: Path, scales: List[int], plots: bool = True,
+                   max_rows: int = MAX_ROWS) -> Dict[str, Any]:
+    results = []
+    for scale in scales:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            result = pool.submit(run_scale, data_dir, scale, plots, max_rows).result()
+        total = sum(stage["wall_s"] for stage in result["stages"])
+        print(f"x{scale:<6d} {result['total_rows']:>12,d} rows  {total:8.2f} s")
+        results.append(result)
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "results": results,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark Analyse.py on synthetically scaled datasets.")
+    parser.add_argument("--data-dir", type=Path, default=Analyse.DATA_DIR, help="folder holding the input CSV files")
+    parser.add_argument("--scales", type=lambda s: [int(x) for x in s.split(",")], default=[1, 100, 10_000],
+                        help="comma-separated row multipliers (default: 1,100,10000)")
+    parser.add_argument("--max-rows", type=int, default=MAX_ROWS,
+                        help=f"cap on the rows of each scaled source (default: {MAX_ROWS:,d})")
+    parser.add_argument("--no-plots", action="store_true", help="skip the plotting stage")
+    parser.add_argument("--output", type=Path, default=Path("benchmark_results.json"), help="JSON results file")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    report = run_benchmarks(args.data_dir, args.scales, plots=not args.no_plots, max_rows=args.max_rows)
+    args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()